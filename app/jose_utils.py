@@ -9,8 +9,31 @@ from app.config import OPENID_PRIVATE_KEY_PATH, URL
 from app.log import LOG
 from app.models import ClientUser
 
+
+class _CachedKeyJWK(jwk.JWK):
+    """jwcrypto rebuilds the cryptography key object from the JWK numbers on
+    every get_op_key() call. The key never changes once loaded so keep it."""
+
+    _CACHED_OPS = ("sign", "verify")
+
+    def __init__(self, **kwargs):
+        self._op_keys = {}
+        super().__init__(**kwargs)
+
+    def get_op_key(self, operation=None, arg=None):
+        if operation not in self._CACHED_OPS:
+            return super().get_op_key(operation, arg)
+
+        if (operation, arg) not in self._op_keys:
+            self._op_keys[(operation, arg)] = super().get_op_key(operation, arg)
+
+        return self._op_keys[(operation, arg)]
+
+
 with open(OPENID_PRIVATE_KEY_PATH, "rb") as f:
-    _key = jwk.JWK.from_pem(f.read())
+    _key = _CachedKeyJWK.from_pem(f.read())
+
+_id_token_header = {"alg": "RS256", "kid": _key.key_id}
 
 
 def get_jwk_key() -> dict:
@@ -51,9 +74,7 @@ def make_id_token(
 
     claims = {**claims, **client_user.get_user_info()}
 
-    jwt_token = jwt.JWT(
-        header={"alg": "RS256", "kid": _key._public_params()["kid"]}, claims=claims
-    )
+    jwt_token = jwt.JWT(header=_id_token_header, claims=claims)
     jwt_token.make_signed_token(_key)
     return jwt_token.serialize()
 
@@ -1,4 +1,6 @@
-from typing import Dict
+import os
+import secrets
+from typing import Dict, List
 from urllib.parse import urlparse
 
 from flask import request, render_template, redirect, flash, url_for
@@ -330,24 +332,22 @@ def construct_redirect_args(
 
 
 def construct_url(url, args: Dict[str, str], fragment: bool = False):
-    for i, (k, v) in enumerate(args.items()):
-        # make sure to escape v
-        v = encode_url(v)
+    if not args:
+        return url
 
-        if i == 0:
-            if fragment:
-                url += f"#{k}={v}"
-            else:
-                url += f"?{k}={v}"
-        else:
-            url += f"&{k}={v}"
+    # make sure to escape v
+    params = "&".join(f"{k}={encode_url(v)}" for k, v in args.items())
 
-    return url
+    if fragment:
+        return f"{url}#{params}"
+    else:
+        return f"{url}?{params}"
 
 
 def generate_access_token() -> str:
     """generate an access-token that does not exist before"""
-    access_token = random_string(40)
+    # 20 random bytes in a single os.urandom() call, hex-encoded to 40 chars
+    access_token = secrets.token_hex(20)
 
     if not OauthToken.get_by(access_token=access_token):
         return access_token
@@ -357,6 +357,33 @@ def generate_access_token() -> str:
     return generate_access_token()
 
 
+def generate_access_tokens(nb_tokens: int) -> List[str]:
+    """generate nb_tokens distinct access-tokens that do not exist before.
+    For bulk issuance: the entropy is read in a single os.urandom() call and the
+    uniqueness is checked with one query per batch"""
+    access_tokens = set()
+
+    while len(access_tokens) < nb_tokens:
+        nb_missing = nb_tokens - len(access_tokens)
+        entropy = os.urandom(20 * nb_missing)
+        candidates = {
+            entropy[i : i + 20].hex() for i in range(0, len(entropy), 20)
+        } - access_tokens
+
+        existing = {
+            access_token
+            for (access_token,) in Session.query(OauthToken.access_token).filter(
+                OauthToken.access_token.in_(candidates)
+            )
+        }
+        if existing:
+            LOG.w("%s access tokens already exist, generate new ones", len(existing))
+
+        access_tokens |= candidates - existing
+
+    return list(access_tokens)
+
+
 def get_host_name_and_scheme(url: str) -> (str, str):
     """http://localhost:7777?a=b -> (localhost, http)"""
     url_comp = urlparse(url)
@@ -1,3 +1,5 @@
+import hmac
+
 from flask import request, jsonify
 from flask_cors import cross_origin
 
@@ -29,11 +31,17 @@ def token():
         request.authorization and request.authorization.password
     ) or request.form.get("client_secret")
 
-    client = Client.filter_by(
-        oauth_client_id=oauth_client_id, oauth_client_secret=oauth_client_secret
-    ).first()
-
-    if not client:
+    # oauth_client_id is unique: fetch by it and check the secret here rather than
+    # sending it to the DB as part of the filter
+    client = Client.get_by(oauth_client_id=oauth_client_id)
+
+    if (
+        not client
+        or not oauth_client_secret
+        or not hmac.compare_digest(
+            client.oauth_client_secret.encode(), oauth_client_secret.encode()
+        )
+    ):
         return jsonify(error="wrong client-id or client-secret"), 400
 
     # Get code from form data
@@ -1,4 +1,6 @@
 import os
+import subprocess
+import sys
 
 # use the tests/test.env config fle
 # flake8: noqa: E402
@@ -8,10 +10,51 @@ os.environ["CONFIG"] = os.path.abspath(
 )
 import sqlalchemy
 
-from app.db import Session, engine, connection
 
-from psycopg2 import errors
-from psycopg2.errorcodes import DEPENDENT_OBJECTS_STILL_EXIST
+def _run_on_db_server(server_uri: str, *statements: str):
+    """run statements that can't be run inside a transaction, like CREATE DATABASE"""
+    admin_engine = sqlalchemy.create_engine(
+        f"{server_uri}/postgres", isolation_level="AUTOCOMMIT"
+    )
+    with admin_engine.connect() as conn:
+        for statement in statements:
+            conn.execute(statement)
+    admin_engine.dispose()
+
+
+def _use_xdist_worker_db(worker: str):
+    """When run with pytest-xdist (pytest -n auto), give each worker its own
+    freshly migrated copy of the test database so workers don't share rows"""
+    from dotenv import dotenv_values
+
+    db_uri = os.environ.get("DB_URI") or dotenv_values(os.environ["CONFIG"])["DB_URI"]
+    server_uri, _, db_name = db_uri.rpartition("/")
+    worker_db_name = f"{db_name}_{worker}"
+
+    _run_on_db_server(
+        server_uri,
+        f'DROP DATABASE IF EXISTS "{worker_db_name}"',
+        f'CREATE DATABASE "{worker_db_name}"',
+    )
+
+    # app.config is not imported yet so it picks up this DB_URI
+    os.environ["DB_URI"] = f"{server_uri}/{worker_db_name}"
+    # migrate in a separate process like scripts/run-test.sh does: migrations/env.py
+    # reconfigures logging and sys.path, which must not leak into the test run
+    root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run(
+        [sys.executable, "-m", "alembic", "upgrade", "head"],
+        env=os.environ,
+        cwd=root_dir,
+        check=True,
+    )
+
+
+if os.environ.get("PYTEST_XDIST_WORKER"):
+    _use_xdist_worker_db(os.environ["PYTEST_XDIST_WORKER"])
+
+
+from app.db import Session, engine, connection
 
 import pytest
 
@@ -24,19 +67,29 @@ app.config["WTF_CSRF_ENABLED"] = False
 app.config["SERVER_NAME"] = "sl.test"
 
 # enable pg_trgm extension
+# it's normally already created by the migrations along with an index that depends
+# on it, so don't drop and re-create it on every run
 with engine.connect() as conn:
-    try:
-        conn.execute("DROP EXTENSION if exists pg_trgm")
-        conn.execute("CREATE EXTENSION pg_trgm")
-    except sqlalchemy.exc.InternalError as e:
-        if isinstance(e.orig, errors.lookup(DEPENDENT_OBJECTS_STILL_EXIST)):
-            print(">>> pg_trgm can't be dropped, ignore")
-        conn.execute("Rollback")
+    conn.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
 
 add_sl_domains()
 add_proton_partner()
 
 
+def pytest_sessionfinish(session, exitstatus):
+    """Drop the pytest-xdist worker database so it isn't left on the db server"""
+    if not os.environ.get("PYTEST_XDIST_WORKER"):
+        return
+
+    # close every connection to the worker database before dropping it
+    Session.remove()
+    connection.close()
+    engine.dispose()
+
+    server_uri, _, worker_db_name = os.environ["DB_URI"].rpartition("/")
+    _run_on_db_server(server_uri, f'DROP DATABASE IF EXISTS "{worker_db_name}"')
+
+
 @pytest.fixture
 def flask_app():
     yield app
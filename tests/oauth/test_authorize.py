@@ -1,24 +1,82 @@
-import base64
+import binascii
 import json
+from typing import Dict, Optional
 from urllib.parse import urlparse, parse_qs
 
+import pytest
 from flask import url_for
 
 from app.db import Session
 from app.jose_utils import verify_id_token, decode_id_token
-from app.models import Client, User, ClientUser, RedirectUri
+from app.models import Client, ClientUser, RedirectUri
 from app.oauth.views.authorize import (
     get_host_name_and_scheme,
     generate_access_token,
+    generate_access_tokens,
     construct_url,
 )
-from tests.utils import login, random_domain, random_string, random_email
+from tests.utils import login, random_domain, create_new_user
+
+
+# user info returned by the token endpoint, besides the ClientUser "id" and "sub"
+EXPECTED_USER_INFO = {
+    "avatar_url": None,
+    "client": "test client",
+    "email": "x@y.z",
+    "email_verified": True,
+    "name": "AB CD",
+}
 
 
 def generate_random_uri() -> str:
     return f"https://{random_domain()}/callback"
 
 
+def split_redirect(location: str) -> (str, str, Dict[str, str]):
+    """Cheaper urlparse + parse_qs for the plain redirect urls returned by authorize
+    https://ab.cd/callback?state=teststate&code=knuyjepwvg
+    -> ("ab.cd", "", {"state": "teststate", "code": "knuyjepwvg"})"""
+    location, _, fragment = location.partition("#")
+    head, _, query = location.partition("?")
+    netloc = head.split("://", 1)[1].split("/", 1)[0]
+    queries = dict(kv.split("=", 1) for kv in query.split("&") if kv)
+
+    return netloc, fragment, queries
+
+
+def basic_auth_header(client: Client, secret: Optional[str] = None) -> str:
+    """Authorization header used by the client to call the token endpoint"""
+    if secret is None:
+        secret = client.oauth_client_secret
+    credentials = f"{client.oauth_client_id}:{secret}"
+    return "Basic " + binascii.b2a_base64(credentials.encode(), newline=False).decode()
+
+
+AUTHORIZE_PATH = "/oauth/authorize"
+
+
+def authorize_query(client_id: str, redirect_uri: str, **params) -> Dict[str, str]:
+    """query string for AUTHORIZE_PATH, given to the test client as query_string
+    instead of resolving and encoding a full url with url_for()"""
+    return {
+        "client_id": client_id,
+        "state": "teststate",
+        "redirect_uri": redirect_uri,
+        **params,
+    }
+
+
+@pytest.fixture
+def oauth_client(flask_client) -> Client:
+    """OAuth client owned by a new user.
+    Only flushed: flask_client rolls back everything at the end of the test"""
+    user = create_new_user()
+    client = Client.create_new("test client", user.id)
+    Session.flush()
+
+    return client
+
+
 def test_get_host_name_and_scheme():
     assert get_host_name_and_scheme("http://localhost:8000?a=b") == (
         "localhost",
@@ -29,139 +87,138 @@ def test_get_host_name_and_scheme():
         "https://www.bubblecode.net/en/2016/01/22/understanding-oauth2/#Implicit_Grant"
     ) == ("www.bubblecode.net", "https")
 
+    assert get_host_name_and_scheme("http://localhost@evil.com/callback") == (
+        "evil.com",
+        "http",
+    )
+    assert get_host_name_and_scheme("HTTP://[::1]:8000/callback") == ("::1", "http")
+    assert get_host_name_and_scheme("app:callback") == (None, "app")
+    assert get_host_name_and_scheme("http://[fe80::1%25ETH0]/") == (
+        "fe80::1%25ETH0",
+        "http",
+    )
+
+    # malformed bracketed netloc is rejected like urlparse() does
+    with pytest.raises(ValueError):
+        get_host_name_and_scheme("http://]:]@localhost/")
+    with pytest.raises(ValueError):
+        get_host_name_and_scheme("http://[::1/callback")
+    # netloc whose NFKC form moves the host, e.g. to evil.com
+    with pytest.raises(ValueError):
+        get_host_name_and_scheme("http://localhost:\ufe6bevil.com/cb")
+    with pytest.raises(ValueError):
+        get_host_name_and_scheme("https://127.0.0.1:\uff20evil.com/cb")
+
 
 def test_generate_access_token(flask_client):
     access_token = generate_access_token()
     assert len(access_token) == 40
 
 
+def test_generate_access_tokens(flask_client):
+    access_tokens = generate_access_tokens(10)
+    assert len(set(access_tokens)) == 10
+    assert all(len(access_token) == 40 for access_token in access_tokens)
+
+
 def test_construct_url():
     url = construct_url("http://ab.cd", {"x": "1 2"})
     assert url == "http://ab.cd?x=1%202"
 
 
-def test_authorize_page_non_login_user(flask_client):
+def test_authorize_page_non_login_user(flask_client, oauth_client):
     """make sure to display login page for non-authenticated user"""
-    user = User.create(random_email(), random_string())
-    Session.commit()
-
-    client = Client.create_new(random_string(), user.id)
-    Session.commit()
+    client = oauth_client
 
     uri = generate_random_uri()
     RedirectUri.create(
         client_id=client.id,
         uri=uri,
-        commit=True,
+        flush=True,
     )
 
     r = flask_client.get(
-        url_for(
-            "oauth.authorize",
-            client_id=client.oauth_client_id,
-            state="teststate",
-            redirect_uri=uri,
+        AUTHORIZE_PATH,
+        query_string=authorize_query(
+            client.oauth_client_id,
+            uri,
             response_type="code",
-        )
+        ),
     )
 
-    html = r.get_data(as_text=True)
     assert r.status_code == 200
-    assert "Sign in to accept sharing data with" in html
+    assert b"Sign in to accept sharing data with" in r.data
 
 
-def test_authorize_page_login_user_non_supported_flow(flask_client):
+def test_authorize_page_login_user_non_supported_flow(flask_client, oauth_client):
     """return 400 if the flow is not supported"""
-    user = login(flask_client)
-    client = Client.create_new("test client", user.id)
-    Session.commit()
-
-    # Not provide any flow
-    r = flask_client.get(
-        url_for(
-            "oauth.authorize",
-            client_id=client.oauth_client_id,
-            state="teststate",
-            redirect_uri="http://localhost",
-            # not provide response_type param here
+    client = oauth_client
+    login(flask_client, client.user)
+
+    for flow_params in (
+        # Not provide any flow
+        {},
+        # SL does not support this flow combination
+        {"response_type": "code token id_token"},
+    ):
+        r = flask_client.get(
+            AUTHORIZE_PATH,
+            query_string=authorize_query(
+                client.oauth_client_id, "http://localhost", **flow_params
+            ),
         )
-    )
 
-    # Provide a not supported flow
-    html = r.get_data(as_text=True)
-    assert r.status_code == 400
-    assert "SimpleLogin only support the following OIDC flows" in html
+        assert r.status_code == 400
+        assert b"SimpleLogin only support the following OIDC flows" in r.data
 
-    r = flask_client.get(
-        url_for(
-            "oauth.authorize",
-            client_id=client.oauth_client_id,
-            state="teststate",
-            redirect_uri="http://localhost",
-            # SL does not support this flow combination
-            response_type="code token id_token",
-        )
-    )
 
-    html = r.get_data(as_text=True)
-    assert r.status_code == 400
-    assert "SimpleLogin only support the following OIDC flows" in html
-
-
-def test_authorize_page_login_user(flask_client):
+def test_authorize_page_login_user(flask_client, oauth_client):
     """make sure to display authorization page for authenticated user"""
-    user = login(flask_client)
-    client = Client.create_new("test client", user.id)
-
-    Session.commit()
+    client = oauth_client
+    user = login(flask_client, client.user)
 
     uri = generate_random_uri()
     RedirectUri.create(
         client_id=client.id,
         uri=uri,
-        commit=True,
+        flush=True,
     )
 
     r = flask_client.get(
-        url_for(
-            "oauth.authorize",
-            client_id=client.oauth_client_id,
-            state="teststate",
-            redirect_uri=uri,
+        AUTHORIZE_PATH,
+        query_string=authorize_query(
+            client.oauth_client_id,
+            uri,
             response_type="code",
-        )
+        ),
     )
 
-    html = r.get_data(as_text=True)
     assert r.status_code == 200
-    assert f"{user.email} (Personal Email)" in html
+    assert f"{user.email} (Personal Email)".encode() in r.data
 
 
-def test_authorize_code_flow_no_openid_scope(flask_client):
-    """make sure the authorize redirects user to correct page for the *Code Flow*
-    and when the *openid* scope is not present
-    , ie when response_type=code, openid not in scope
-    """
+def run_code_flow(flask_client, client: Client, scope: Optional[str] = None) -> dict:
+    """go through the *Code Flow*: the user allows client on the authorization page,
+    then the client exchanges the code against an access_token.
+    Return the token endpoint response"""
+    params = {"scope": scope} if scope else {}
 
-    user = login(flask_client)
-    client = Client.create_new("test client", user.id)
-    Session.commit()
     domain = random_domain()
     uri = f"https://{domain}/callback"
     RedirectUri.create(
         client_id=client.id,
         uri=uri,
-        commit=True,
+        flush=True,
     )
 
     # user allows client on the authorization page
     r = flask_client.post(
-        url_for(
-            "oauth.authorize",
-            client_id=client.oauth_client_id,
-            state="teststate",
-            redirect_uri=uri,
+        AUTHORIZE_PATH,
+        query_string=authorize_query(
+            client.oauth_client_id,
+            uri,
             response_type="code",
+            **params,
         ),
         data={"button": "allow", "suggested-email": "x@y.z", "suggested-name": "AB CD"},
         # user will be redirected to client page, do not allow redirection here
@@ -172,27 +229,22 @@ def test_authorize_code_flow_no_openid_scope(flask_client):
     assert r.status_code == 302  # user gets redirected back to client page
 
     # r.location will have this form http://localhost?state=teststate&code=knuyjepwvg
-    o = urlparse(r.location)
-    assert o.netloc == domain
-    assert not o.fragment
+    netloc, fragment, queries = split_redirect(r.location)
+    assert netloc == domain
+    assert not fragment
 
-    # parse the query, should return something like
-    # {'state': ['teststate'], 'code': ['knuyjepwvg']}
-    queries = parse_qs(o.query)
-    assert len(queries) == 2
+    # the query should be something like
+    # {'state': 'teststate', 'code': 'knuyjepwvg'} (+ 'scope': 'openid' if asked)
+    assert len(queries) == 2 + len(params)
 
-    assert queries["state"] == ["teststate"]
-    assert len(queries["code"]) == 1
+    assert queries["state"] == "teststate"
+    assert queries["code"]
 
     # Exchange the code to get access_token
-    basic_auth_headers = base64.b64encode(
-        f"{client.oauth_client_id}:{client.oauth_client_secret}".encode()
-    ).decode("utf-8")
-
     r = flask_client.post(
         url_for("oauth.token"),
-        headers={"Authorization": "Basic " + basic_auth_headers},
-        data={"grant_type": "authorization_code", "code": queries["code"][0]},
+        headers={"Authorization": basic_auth_header(client)},
+        data={"grant_type": "authorization_code", "code": queries["code"]},
     )
 
     # r.json should have this format
@@ -211,153 +263,70 @@ def test_authorize_code_flow_no_openid_scope(flask_client):
     #   }
     # }
     assert r.status_code == 200
-    assert r.json["access_token"]
-    assert r.json["expires_in"] == 3600
-    assert not r.json["scope"]
-    assert r.json["token_type"] == "Bearer"
+    return r.get_json()
 
-    client_user = ClientUser.get_by(client_id=client.id)
 
-    assert r.json["user"] == {
-        "avatar_url": None,
-        "client": "test client",
-        "email": "x@y.z",
-        "email_verified": True,
-        "id": client_user.id,
-        "name": "AB CD",
-        "sub": str(client_user.id),
-    }
-
-
-def test_authorize_code_flow_with_openid_scope(flask_client):
+@pytest.mark.parametrize("scope", [None, "openid"])
+def test_authorize_code_flow(flask_client, oauth_client, scope):
     """make sure the authorize redirects user to correct page for the *Code Flow*
-    and when the *openid* scope is present
-    , ie when response_type=code, openid in scope
+    , ie when response_type=code, with and without the *openid* scope
 
     The authorize endpoint should stay the same: return the *code*.
-    The token endpoint however should now return id_token in addition to the access_token
+    The token endpoint however should return id_token in addition to the access_token
+    when openid is in scope
     """
 
-    user = login(flask_client)
-    client = Client.create_new("test client", user.id)
+    client = oauth_client
+    login(flask_client, client.user)
 
-    Session.commit()
-
-    domain = random_domain()
-    uri = f"https://{domain}/callback"
-    RedirectUri.create(
-        client_id=client.id,
-        uri=uri,
-        commit=True,
-    )
-
-    # user allows client on the authorization page
-    r = flask_client.post(
-        url_for(
-            "oauth.authorize",
-            client_id=client.oauth_client_id,
-            state="teststate",
-            redirect_uri=uri,
-            response_type="code",
-            scope="openid",  # openid is in scope
-        ),
-        data={"button": "allow", "suggested-email": "x@y.z", "suggested-name": "AB CD"},
-        # user will be redirected to client page, do not allow redirection here
-        # to assert the redirect url
-        # follow_redirects=True,
-    )
-
-    assert r.status_code == 302  # user gets redirected back to client page
-
-    # r.location will have this form http://localhost?state=teststate&code=knuyjepwvg
-    o = urlparse(r.location)
-    assert o.netloc == domain
-    assert not o.fragment
-
-    # parse the query, should return something like
-    # {'state': ['teststate'], 'code': ['knuyjepwvg'], 'scope': ["openid"]}
-    queries = parse_qs(o.query)
-    assert len(queries) == 3
-
-    assert queries["state"] == ["teststate"]
-    assert len(queries["code"]) == 1
-
-    # Exchange the code to get access_token
-    basic_auth_headers = base64.b64encode(
-        f"{client.oauth_client_id}:{client.oauth_client_secret}".encode()
-    ).decode("utf-8")
-
-    r = flask_client.post(
-        url_for("oauth.token"),
-        headers={"Authorization": "Basic " + basic_auth_headers},
-        data={"grant_type": "authorization_code", "code": queries["code"][0]},
-    )
-
-    # r.json should have this format
-    # {
-    #   'access_token': 'avmhluhonsouhcwwailydwvhankspptgidoggcbu',
-    #   'expires_in': 3600,
-    #   'scope': '',
-    #   'token_type': 'bearer',
-    #   'user': {
-    #     'avatar_url': None,
-    #     'client': 'test client',
-    #     'email': 'x@y.z',
-    #     'email_verified': True,
-    #     'id': 1,
-    #     'name': 'AB CD'
-    #   }
-    # }
-    assert r.status_code == 200
-    assert r.json["access_token"]
-    assert r.json["expires_in"] == 3600
-    assert r.json["scope"] == "openid"
-    assert r.json["token_type"] == "Bearer"
+    data = run_code_flow(flask_client, client, scope)
+    assert data["access_token"]
+    assert data["expires_in"] == 3600
+    assert data["token_type"] == "Bearer"
 
     client_user = ClientUser.get_by(client_id=client.id)
 
-    assert r.json["user"] == {
-        "avatar_url": None,
-        "client": "test client",
-        "email": "x@y.z",
-        "email_verified": True,
+    assert data["user"] == {
+        **EXPECTED_USER_INFO,
         "id": client_user.id,
-        "name": "AB CD",
         "sub": str(client_user.id),
     }
 
-    # id_token must be returned
-    assert r.json["id_token"]
+    if scope == "openid":
+        assert data["scope"] == "openid"
 
-    # id_token must be a valid, correctly signed JWT
-    assert verify_id_token(r.json["id_token"])
+        # id_token must be returned
+        assert data["id_token"]
+
+        # id_token must be a valid, correctly signed JWT
+        assert verify_id_token(data["id_token"])
+    else:
+        assert not data["scope"]
 
 
-def test_authorize_token_flow(flask_client):
+def test_authorize_token_flow(flask_client, oauth_client):
     """make sure the authorize redirects user to correct page for the *Token Flow*
     , ie when response_type=token
     The /authorize endpoint should return an access_token
     """
 
-    user = login(flask_client)
-    client = Client.create_new("test client", user.id)
+    client = oauth_client
+    login(flask_client, client.user)
 
-    Session.commit()
     domain = random_domain()
     uri = f"https://{domain}/callback"
     RedirectUri.create(
         client_id=client.id,
         uri=uri,
-        commit=True,
+        flush=True,
     )
 
     # user allows client on the authorization page
     r = flask_client.post(
-        url_for(
-            "oauth.authorize",
-            client_id=client.oauth_client_id,
-            state="teststate",
-            redirect_uri=uri,
+        AUTHORIZE_PATH,
+        query_string=authorize_query(
+            client.oauth_client_id,
+            uri,
             response_type="token",  # token flow
         ),
         data={"button": "allow", "suggested-email": "x@y.z", "suggested-name": "AB CD"},
@@ -387,31 +356,29 @@ def test_authorize_token_flow(flask_client):
     assert len(queries["access_token"]) == 1
 
 
-def test_authorize_id_token_flow(flask_client):
+def test_authorize_id_token_flow(flask_client, oauth_client):
     """make sure the authorize redirects user to correct page for the *ID-Token Flow*
     , ie when response_type=id_token
     The /authorize endpoint should return an id_token
     """
 
-    user = login(flask_client)
-    client = Client.create_new("test client", user.id)
+    client = oauth_client
+    login(flask_client, client.user)
 
-    Session.commit()
     domain = random_domain()
     uri = f"https://{domain}/callback"
     RedirectUri.create(
         client_id=client.id,
         uri=uri,
-        commit=True,
+        flush=True,
     )
 
     # user allows client on the authorization page
     r = flask_client.post(
-        url_for(
-            "oauth.authorize",
-            client_id=client.oauth_client_id,
-            state="teststate",
-            redirect_uri=uri,
+        AUTHORIZE_PATH,
+        query_string=authorize_query(
+            client.oauth_client_id,
+            uri,
             response_type="id_token",  # id_token flow
         ),
         data={"button": "allow", "suggested-email": "x@y.z", "suggested-name": "AB CD"},
@@ -442,32 +409,30 @@ def test_authorize_id_token_flow(flask_client):
     assert verify_id_token(queries["id_token"][0])
 
 
-def test_authorize_token_id_token_flow(flask_client):
+def test_authorize_token_id_token_flow(flask_client, oauth_client):
     """make sure the authorize redirects user to correct page for the *ID-Token Token Flow*
     , ie when response_type=id_token,token
     The /authorize endpoint should return an id_token and access_token
     id_token, once decoded, should contain *at_hash* in payload
     """
 
-    user = login(flask_client)
-    client = Client.create_new("test client", user.id)
+    client = oauth_client
+    login(flask_client, client.user)
 
-    Session.commit()
     domain = random_domain()
     uri = f"https://{domain}/callback"
     RedirectUri.create(
         client_id=client.id,
         uri=uri,
-        commit=True,
+        flush=True,
     )
 
     # user allows client on the authorization page
     r = flask_client.post(
-        url_for(
-            "oauth.authorize",
-            client_id=client.oauth_client_id,
-            state="teststate",
-            redirect_uri=uri,
+        AUTHORIZE_PATH,
+        query_string=authorize_query(
+            client.oauth_client_id,
+            uri,
             response_type="id_token token",  # id_token,token flow
         ),
         data={"button": "allow", "suggested-email": "x@y.z", "suggested-name": "AB CD"},
@@ -537,7 +502,7 @@ def test_authorize_token_id_token_flow(flask_client):
     assert "sub" in payload
 
 
-def test_authorize_code_id_token_flow(flask_client):
+def test_authorize_code_id_token_flow(flask_client, oauth_client):
     """make sure the authorize redirects user to correct page for the *ID-Token Code Flow*
     , ie when response_type=id_token,code
     The /authorize endpoint should return an id_token, code and id_token must contain *c_hash*
@@ -546,25 +511,23 @@ def test_authorize_code_id_token_flow(flask_client):
 
     """
 
-    user = login(flask_client)
-    client = Client.create_new("test client", user.id)
+    client = oauth_client
+    login(flask_client, client.user)
 
-    Session.commit()
     domain = random_domain()
     uri = f"https://{domain}/callback"
     RedirectUri.create(
         client_id=client.id,
         uri=uri,
-        commit=True,
+        flush=True,
     )
 
     # user allows client on the authorization page
     r = flask_client.post(
-        url_for(
-            "oauth.authorize",
-            client_id=client.oauth_client_id,
-            state="teststate",
-            redirect_uri=uri,
+        AUTHORIZE_PATH,
+        query_string=authorize_query(
+            client.oauth_client_id,
+            uri,
             response_type="id_token code",  # id_token,code flow
         ),
         data={"button": "allow", "suggested-email": "x@y.z", "suggested-name": "AB CD"},
@@ -633,13 +596,9 @@ def test_authorize_code_id_token_flow(flask_client):
     assert "sub" in payload
 
     # <<< Exchange the code to get access_token >>>
-    basic_auth_headers = base64.b64encode(
-        f"{client.oauth_client_id}:{client.oauth_client_secret}".encode()
-    ).decode("utf-8")
-
     r = flask_client.post(
         url_for("oauth.token"),
-        headers={"Authorization": "Basic " + basic_auth_headers},
+        headers={"Authorization": basic_auth_header(client)},
         data={"grant_type": "authorization_code", "code": queries["code"][0]},
     )
 
@@ -660,90 +619,93 @@ def test_authorize_code_id_token_flow(flask_client):
     #   }
     # }
     assert r.status_code == 200
-    assert r.json["access_token"]
-    assert r.json["expires_in"] == 3600
-    assert not r.json["scope"]
-    assert r.json["token_type"] == "Bearer"
+    data = r.get_json()
+    assert data["access_token"]
+    assert data["expires_in"] == 3600
+    assert not data["scope"]
+    assert data["token_type"] == "Bearer"
 
     client_user = ClientUser.get_by(client_id=client.id)
 
-    assert r.json["user"] == {
-        "avatar_url": None,
-        "client": "test client",
-        "email": "x@y.z",
-        "email_verified": True,
+    assert data["user"] == {
+        **EXPECTED_USER_INFO,
         "id": client_user.id,
-        "name": "AB CD",
         "sub": str(client_user.id),
     }
 
     # id_token must be returned
-    assert r.json["id_token"]
+    assert data["id_token"]
 
     # id_token must be a valid, correctly signed JWT
-    assert verify_id_token(r.json["id_token"])
+    assert verify_id_token(data["id_token"])
 
 
-def test_authorize_page_invalid_client_id(flask_client):
+def test_authorize_page_invalid_client_id(flask_client, oauth_client):
     """make sure to redirect user to redirect_url?error=invalid_client_id"""
-    user = login(flask_client)
-    Client.create_new("test client", user.id)
-
-    Session.commit()
+    login(flask_client, oauth_client.user)
 
     r = flask_client.get(
-        url_for(
-            "oauth.authorize",
-            client_id="invalid_client_id",
-            state="teststate",
-            redirect_uri="http://localhost",
+        AUTHORIZE_PATH,
+        query_string=authorize_query(
+            "invalid_client_id",
+            "http://localhost",
             response_type="code",
-        )
+        ),
     )
 
     assert r.status_code == 302
     assert r.location == url_for("auth.login")
 
 
-def test_authorize_page_http_not_allowed(flask_client):
+def test_authorize_page_http_not_allowed(flask_client, oauth_client):
     """make sure to redirect user to redirect_url?error=http_not_allowed"""
-    user = login(flask_client)
-    client = Client.create_new("test client", user.id)
+    client = oauth_client
+    login(flask_client, client.user)
     client.approved = True
 
-    Session.commit()
+    Session.flush()
 
     r = flask_client.get(
-        url_for(
-            "oauth.authorize",
-            client_id=client.oauth_client_id,
-            state="teststate",
-            redirect_uri="http://mywebsite.com",
+        AUTHORIZE_PATH,
+        query_string=authorize_query(
+            client.oauth_client_id,
+            "http://mywebsite.com",
             response_type="code",
-        )
+        ),
     )
 
     assert r.status_code == 302
     assert r.location == url_for("dashboard.index")
 
 
-def test_authorize_page_unknown_redirect_uri(flask_client):
+def test_authorize_page_unknown_redirect_uri(flask_client, oauth_client):
     """make sure to redirect user to redirect_url?error=unknown_redirect_uri"""
-    user = login(flask_client)
-    client = Client.create_new("test client", user.id)
+    client = oauth_client
+    login(flask_client, client.user)
     client.approved = True
 
-    Session.commit()
+    Session.flush()
 
     r = flask_client.get(
-        url_for(
-            "oauth.authorize",
-            client_id=client.oauth_client_id,
-            state="teststate",
-            redirect_uri="https://unknown.com",
+        AUTHORIZE_PATH,
+        query_string=authorize_query(
+            client.oauth_client_id,
+            "https://unknown.com",
             response_type="code",
-        )
+        ),
     )
 
     assert r.status_code == 302
     assert r.location == url_for("dashboard.index")
+
+
+def test_token_wrong_client_secret(flask_client, oauth_client):
+    """make sure the token endpoint rejects a wrong client secret"""
+    r = flask_client.post(
+        url_for("oauth.token"),
+        headers={"Authorization": basic_auth_header(oauth_client, "wrong-secret")},
+        data={"grant_type": "authorization_code", "code": "code"},
+    )
+
+    assert r.status_code == 400
+    assert r.json == {"error": "wrong client-id or client-secret"}
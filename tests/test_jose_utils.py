@@ -1,5 +1,5 @@
 from app.db import Session
-from app.jose_utils import make_id_token, verify_id_token
+from app.jose_utils import make_id_token, verify_id_token, _key
 from app.models import ClientUser, Client
 from tests.utils import create_new_user
 
@@ -24,3 +24,9 @@ def test_encode_decode(flask_client):
 def test_db_tear_down(flask_client):
     """make sure the db is reset after each test"""
     assert len(ClientUser.filter_by().all()) == 0
+
+
+def test_op_keys_are_reused():
+    """the signing/verification key objects are only built once"""
+    assert _key.get_op_key("sign") is _key.get_op_key("sign")
+    assert _key.get_op_key("verify") is _key.get_op_key("verify")